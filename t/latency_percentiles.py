@@ -11,7 +11,8 @@
 # of slat, clat, and lat percentiles
 #
 # USAGE
-# python3 latency-tests.py [-f fio-path] [-a artifact-root] [--debug]
+# python3 latency-tests.py [-f fio-path] [-a artifact-root] [--debug] [--verbose]
+#       [--jobs N] [--binary-logs] [--histogram]
 #
 #
 # Test scenarios:
@@ -71,41 +72,197 @@
 # echo confirm that fsync latencies appear
 """
 
+import io
 import os
-import csv
+import re
 import sys
-import json
 import math
+import mmap
 import time
+import asyncio
 import argparse
 import platform
-import subprocess
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+_COMMA_TO_SPACE = bytes.maketrans(b',', b' ')
+_TERSE_RE = re.compile(rb'^3;fio-[^\r\n]*', re.MULTILINE)
+_JSON_START_RE = re.compile(rb'^[ \t]*{', re.MULTILINE)
+_SYSTEM = platform.system()
+# Shortest possible latency log line: time, latency, data direction, block size, priority
+_MIN_LOG_LINE = len(b'0, 0, 0, 0, 0\n')
+_BIN_DTYPE = np.dtype([('duration', np.int64), ('count', np.int64)])
+# fio's latency bins have a proportional error of less than 1/_ERR_SCALE (see stat.h)
+_ERR_SCALE = 128
+# Amount of latency log text to parse at a time
+_LOG_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+#
+# The theory in stat.h says that the proportional error between a latency
+# and the value of the bin fio stores it in will be less than 1/128.
+# find_mismatches() returns a mask of the percentiles where fio's value
+# falls outside this bound relative to the value at the corresponding index
+# of the measured latencies. The comparison is cross-multiplied to keep it
+# in integer arithmetic. Use a compiled loop if numba is available, which
+# avoids the temporary arrays created by the numpy expression.
+#
+if njit:
+    @njit(cache=True)
+    def find_mismatches(latencies, indices, fio_vals):
+        """Flag fio percentile values outside the error bound (numba version)."""
+        bad = np.empty(indices.size, np.bool_)
+        for i in range(indices.size):
+            expected = latencies[indices[i]]
+            fio_val = fio_vals[i]
+            delta = fio_val - expected if fio_val > expected else expected - fio_val
+            bad[i] = delta * _ERR_SCALE > expected
+        return bad
+else:
+    def find_mismatches(latencies, indices, fio_vals):
+        """Flag fio percentile values outside the error bound (numpy version)."""
+        expected = latencies[indices]
+        return np.abs(fio_vals - expected) * _ERR_SCALE > expected
+
+
+def parse_lat_lines(data, ncols, lat_file):
+    """
+    Parse lines of fio latency log text.
+
+    Every line of a latency log has the same number of comma-separated integer fields.
+    Rather than parsing the text line by line, turn the commas into whitespace and let
+    numpy convert the whole buffer in one pass. The flat array is then reshaped to one row
+    per line.
+
+    data        bytes holding whole lines of a latency log
+    ncols       number of fields per line
+    lat_file    path to the latency log, used for error messages
+
+    Returns an array with one row per line; column 0 is the latency and column 1 is the
+    data direction.
+    """
+
+    values = np.fromstring(data.translate(_COMMA_TO_SPACE), dtype=np.int64, sep=' ')
+    if values.size % ncols:
+        raise ValueError("%s: unexpected number of fields" % lat_file)
+
+    return values.reshape(-1, ncols)[:, 1:3]
+
+
+class LatencyHistogram():
+    """
+    Latency histogram using the same bins as fio.
+
+    fio does not keep every latency sample. It counts samples in log-linear bins and
+    calculates percentiles from the bin counts. This histogram uses the same bins (see
+    FIO_IO_U_PLAT_* in stat.h) so that percentiles can be calculated from latency logs of
+    any size in constant memory.
+    """
+
+    PLAT_BITS = 6
+    PLAT_VAL = 1 << PLAT_BITS
+    PLAT_GROUP_NR = 29
+    PLAT_NR = PLAT_GROUP_NR * PLAT_VAL
+
+    def __init__(self):
+        self.counts = np.zeros(self.PLAT_NR, dtype=np.int64)
+
+        # Value represented by each bin, as calculated by plat_idx_to_val() in stat.c
+        idx = np.arange(self.PLAT_NR, dtype=np.int64)
+        error_bits = np.maximum((idx >> self.PLAT_BITS) - 1, 1)
+        base = np.left_shift(1, error_bits + self.PLAT_BITS)
+        bucket = idx % self.PLAT_VAL
+        self.values = np.where(idx < (self.PLAT_VAL << 1), idx,
+                               base + ((2 * bucket + 1) << (error_bits - 1)))
+
+    def add(self, latencies):
+        """
+        Add latency samples to the histogram.
+
+        Samples are assigned to bins as plat_val_to_idx() in stat.c does.
+
+        latencies   array of latency samples
+        """
+
+        latencies = np.asarray(latencies, dtype=np.int64)
+        msb = np.frexp(latencies)[1] - 1
+        error_bits = np.maximum(msb - self.PLAT_BITS, 0)
+        offset = (latencies >> error_bits) & (self.PLAT_VAL - 1)
+        idx = np.where(msb <= self.PLAT_BITS, latencies,
+                       ((error_bits + 1) << self.PLAT_BITS) + offset)
+        idx = np.minimum(idx, self.PLAT_NR - 1)
+        self.counts += np.bincount(idx, minlength=self.PLAT_NR)
+
+    @property
+    def count(self):
+        """Number of samples in the histogram."""
+
+        return int(self.counts.sum())
+
+    def find_bins(self, ranks):
+        """
+        Find the bins holding the samples of the specified ranks.
+
+        As in calc_clat_percentiles() in stat.c, this is the first bin where the cumulative
+        count reaches each rank.
+
+        ranks       array of 1-based sample ranks
+        """
+
+        cumulative = np.cumsum(self.counts)
+        return np.minimum(np.searchsorted(cumulative, ranks, side='left'), self.PLAT_NR - 1)
 
 
 class FioLatTest():
     """fio latency percentile test."""
 
-    def __init__(self, artifact_root, test_options, debug):
+    def __init__(self, artifact_root, test_options, debug, binary_logs=False, verbose=False,
+                 histogram=False):
         """
         artifact_root   root directory for artifacts (subdirectory will be created under here)
         test            test specification
+        binary_logs     True to cache latency logs that are checked more than once as .npy
+                        files
+        verbose         True to save the fio command line, stdout, and stderr to files
+        histogram       True to check percentiles against a histogram of the latency logs
+                        instead of the raw samples
         """
         self.artifact_root = artifact_root
         self.test_options = test_options
         self.debug = debug
+        self.binary_logs = binary_logs
+        self.verbose = verbose
+        self.histogram = histogram
         self.filename = None
         self.json_data = None
         self.terse_data = None
+        self.messages = io.StringIO()
 
         self.test_dir = os.path.join(self.artifact_root,
                                      "{:03d}".format(self.test_options['test_id']))
-        if not os.path.exists(self.test_dir):
-            os.mkdir(self.test_dir)
+        os.makedirs(self.test_dir, exist_ok=True)
 
         self.filename = "latency{:03d}".format(self.test_options['test_id'])
 
-    def run_fio(self, fio_path):
+    def log(self, *args):
+        """
+        Record a message about this test.
+
+        Tests run concurrently, so messages are collected here and printed together with the
+        test's outcome rather than as they occur.
+        """
+        print(*args, file=self.messages)
+
+    async def run_fio(self, fio_path):
         """Run a test."""
 
         fio_args = [
@@ -118,116 +275,128 @@ class FioLatTest():
             "--group_reporting=1",
             "--write_lat_log={0}".format(self.filename),
             "--output={0}.out".format(self.filename),
-            "--ioengine={ioengine}".format(**self.test_options),
-            "--rw={rw}".format(**self.test_options),
-            "--runtime={runtime}".format(**self.test_options),
-            "--output-format={output-format}".format(**self.test_options),
         ]
-        for opt in ['slat_percentiles', 'clat_percentiles', 'lat_percentiles',
-                    'unified_rw_reporting', 'fsync', 'fdatasync', 'numjobs', 'cmdprio_percentage']:
-            if opt in self.test_options:
-                option = '--{0}={{{0}}}'.format(opt)
-                fio_args.append(option.format(**self.test_options))
+        fio_args += [f"--{opt}={self.test_options[opt]}"
+                     for opt in ('ioengine', 'rw', 'runtime', 'output-format')]
+        fio_args += [f"--{opt}={self.test_options[opt]}"
+                     for opt in ('slat_percentiles', 'clat_percentiles', 'lat_percentiles',
+                                 'unified_rw_reporting', 'fsync', 'fdatasync', 'numjobs',
+                                 'cmdprio_percentage')
+                     if opt in self.test_options]
 
         command = [fio_path] + fio_args
-        with open(os.path.join(self.test_dir, "{0}.command".format(self.filename)), "w+") as \
-                command_file:
-            command_file.write("%s\n" % command)
+
+        #
+        # Only save the command line, stdout, and stderr when asked to. fio
+        # writes its results to the --output file, so otherwise discard
+        # stdout and keep stderr in memory so that it can be reported if fio
+        # fails.
+        #
+        if self.verbose:
+            with open(os.path.join(self.test_dir, "{0}.command".format(self.filename)), "w+") \
+                    as command_file:
+                command_file.write("%s\n" % command)
+            stdout_file = open(os.path.join(self.test_dir,
+                                            "{0}.stdout".format(self.filename)), "w+")
+            stderr_file = open(os.path.join(self.test_dir,
+                                            "{0}.stderr".format(self.filename)), "w+")
+        else:
+            stdout_file = asyncio.subprocess.DEVNULL
+            stderr_file = asyncio.subprocess.PIPE
 
         passed = True
-        stdout_file = open(os.path.join(self.test_dir, "{0}.stdout".format(self.filename)), "w+")
-        stderr_file = open(os.path.join(self.test_dir, "{0}.stderr".format(self.filename)), "w+")
+        stderr = None
+        stderr_reader = None
         exitcode_file = open(os.path.join(self.test_dir,
                                           "{0}.exitcode".format(self.filename)), "w+")
         try:
             proc = None
-            # Avoid using subprocess.run() here because when a timeout occurs,
-            # fio will be stopped with SIGKILL. This does not give fio a
-            # chance to clean up and means that child processes may continue
-            # running and submitting IO.
-            proc = subprocess.Popen(command,
-                                    stdout=stdout_file,
-                                    stderr=stderr_file,
-                                    cwd=self.test_dir,
-                                    universal_newlines=True)
-            proc.communicate(timeout=300)
+            # When a timeout occurs, stop fio with SIGTERM rather than
+            # SIGKILL. This gives fio a chance to clean up so that child
+            # processes do not continue running and submitting IO.
+            proc = await asyncio.create_subprocess_exec(*command,
+                                                        stdout=stdout_file,
+                                                        stderr=stderr_file,
+                                                        cwd=self.test_dir)
+            # Collect stderr in its own task so that what fio writes before
+            # a timeout is kept, rather than lost with a cancelled
+            # communicate().
+            if proc.stderr:
+                stderr_reader = asyncio.ensure_future(proc.stderr.read())
+            await asyncio.wait_for(proc.wait(), timeout=300)
             exitcode_file.write('{0}\n'.format(proc.returncode))
             passed &= (proc.returncode == 0)
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
             proc.terminate()
-            proc.communicate()
-            assert proc.poll()
-            print("Timeout expired")
+            await proc.wait()
+            assert proc.returncode
+            self.log("Timeout expired")
             passed = False
         except Exception:
             if proc:
-                if not proc.poll():
+                if proc.returncode is None:
                     proc.terminate()
-                    proc.communicate()
-            print("Exception: %s" % sys.exc_info())
+                    await proc.wait()
+            self.log("Exception: %s" % sys.exc_info()[1])
             passed = False
         finally:
-            stdout_file.close()
-            stderr_file.close()
+            if self.verbose:
+                stdout_file.close()
+                stderr_file.close()
             exitcode_file.close()
 
-        if passed:
-            if 'json' in self.test_options['output-format']:
-                if not self.get_json():
-                    print('Unable to decode JSON data')
-                    passed = False
-            if 'terse' in self.test_options['output-format']:
-                if not self.get_terse():
-                    print('Unable to decode terse data')
-                    passed = False
+        if stderr_reader:
+            stderr = await stderr_reader
 
-        return passed
+        if not passed and stderr:
+            self.log("fio command %s failed:\n%s" % (command, stderr.decode(errors='replace')))
 
-    def get_json(self):
-        """Convert fio JSON output into a python JSON object"""
-
-        filename = os.path.join(self.test_dir, "{0}.out".format(self.filename))
-        with open(filename, 'r') as file:
-            file_data = file.read()
+        if passed:
+            self.load_output()
+            if 'json' in self.test_options['output-format'] and self.json_data is None:
+                self.log('Unable to decode JSON data')
+                passed = False
+            if 'terse' in self.test_options['output-format'] and self.terse_data is None:
+                self.log('Unable to decode terse data')
+                passed = False
 
-        #
-        # Sometimes fio informational messages are included at the top of the
-        # JSON output, especially under Windows. Try to decode output as JSON
-        # data, lopping off up to the first four lines
-        #
-        lines = file_data.splitlines()
-        for i in range(5):
-            file_data = '\n'.join(lines[i:])
-            try:
-                self.json_data = json.loads(file_data)
-            except json.JSONDecodeError:
-                continue
-            else:
-                return True
+        return passed
 
-        return False
+    def load_output(self):
+        """Read fio output once, extracting both terse and JSON format data."""
 
-    def get_terse(self):
-        """Read fio output and return terse format data."""
+        self.json_data = None
+        self.terse_data = None
 
         filename = os.path.join(self.test_dir, "{0}.out".format(self.filename))
-        with open(filename, 'r') as file:
-            file_data = file.read()
+        if os.path.getsize(filename) == 0:
+            return
 
-        #
-        # Read the first few lines and see if any of them begin with '3;fio-'
-        # If so, the line is probably terse output. Obviously, this only
-        # works for fio terse version 3 and it does not work for
-        # multi-line terse output
-        #
-        lines = file_data.splitlines()
-        for i in range(8):
-            file_data = lines[i]
-            if file_data.startswith('3;fio-'):
-                self.terse_data = file_data.split(';')
-                return True
+        with open(filename, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                #
+                # Terse output comes first when both terse and JSON output
+                # are requested. Look for a line that begins with '3;fio-'.
+                # If there is one, the line is probably terse output.
+                # Obviously, this only works for fio terse version 3 and it
+                # does not work for multi-line terse output.
+                #
+                match = _TERSE_RE.search(buf)
+                if match:
+                    self.terse_data = match.group(0).decode().split(';')
 
-        return False
+                #
+                # Sometimes fio informational messages are also included at
+                # the top of the output, especially under Windows. Skip ahead
+                # to the first line that opens a JSON object and decode from
+                # there.
+                #
+                match = _JSON_START_RE.search(buf)
+                if match:
+                    try:
+                        self.json_data = json_loads(buf[match.start():])
+                    except ValueError:
+                        pass
 
     def check_latencies(self, jsondata, ddir, slat=True, clat=True, tlat=True, plus=False,
                         unified=False):
@@ -252,17 +421,18 @@ class FioLatTest():
 
         for lat in ['slat', 'clat', 'lat']:
             this_iter = True
+            stat = jsondata[lat+'_ns']
             if not types[lat]:
-                if 'percentile' in jsondata[lat+'_ns']:
+                if 'percentile' in stat:
                     this_iter = False
-                    print('unexpected %s percentiles found' % lat)
+                    self.log('unexpected %s percentiles found' % lat)
                 else:
-                    print("%s percentiles skipped" % lat)
+                    self.log("%s percentiles skipped" % lat)
                 continue
             else:
-                if 'percentile' not in jsondata[lat+'_ns']:
+                if 'percentile' not in stat:
                     this_iter = False
-                    print('%s percentiles not found in fio output' % lat)
+                    self.log('%s percentiles not found in fio output' % lat)
 
             #
             # Check only for the presence/absence of json+
@@ -276,75 +446,201 @@ class FioLatTest():
             # from the raw data.
             #
             if plus:
-                if 'bins' not in jsondata[lat+'_ns']:
-                    print('bins not found with json+ output format')
+                if 'bins' not in stat:
+                    self.log('bins not found with json+ output format')
                     this_iter = False
                 else:
-                    if not self.check_jsonplus(jsondata[lat+'_ns']):
+                    if not self.check_jsonplus(stat):
                         this_iter = False
             else:
-                if 'bins' in jsondata[lat+'_ns']:
-                    print('json+ bins found with json output format')
+                if 'bins' in stat:
+                    self.log('json+ bins found with json output format')
                     this_iter = False
 
-            latencies = []
+            lat_files = []
             for i in range(10):
                 lat_file = os.path.join(self.test_dir, "%s_%s.%s.log" % (self.filename, lat, i+1))
                 if not os.path.exists(lat_file):
                     break
-                with open(lat_file, 'r', newline='') as file:
-                    reader = csv.reader(file)
-                    for line in reader:
-                        if unified or int(line[2]) == ddir:
-                            latencies.append(int(line[1]))
+                lat_files.append(lat_file)
 
-            if int(jsondata['total_ios']) != len(latencies):
+            if self.histogram:
+                #
+                # Read the logs a chunk at a time into a histogram so that
+                # memory use does not grow with the length of the run. The
+                # .npy cache holds whole logs, so it is not used here.
+                #
+                hist = LatencyHistogram()
+                for lat_file in lat_files:
+                    for data in self.iter_lat_log(lat_file):
+                        hist.add(data[:, 0] if unified else data[data[:, 1] == ddir, 0])
+                count = hist.count
+            else:
+                #
+                # Size the latency array from the log file sizes and fill it
+                # in place a chunk at a time, rather than parsing whole logs
+                # and concatenating them. Untouched pages at the end of the
+                # array are never faulted in, so overestimating the size costs
+                # nothing.
+                #
+                bound = sum(os.path.getsize(lat_file) for lat_file in lat_files) // _MIN_LOG_LINE
+                latencies = np.empty(bound, dtype=np.int64)
+                count = 0
+                for lat_file in lat_files:
+                    for data in self.load_lat_log(lat_file):
+                        if unified:
+                            num = data.shape[0]
+                            latencies[count:count+num] = data[:, 0]
+                        else:
+                            mask = data[:, 1] == ddir
+                            num = np.count_nonzero(mask)
+                            np.compress(mask, data[:, 0], out=latencies[count:count+num])
+                        count += num
+                latencies = latencies[:count]
+
+            if int(jsondata['total_ios']) != count:
                 this_iter = False
-                print('%s: total_ios = %s, latencies logged = %d' % \
-                        (lat, jsondata['total_ios'], len(latencies)))
+                self.log('%s: total_ios = %s, latencies logged = %d' % \
+                        (lat, jsondata['total_ios'], count))
             elif self.debug:
-                print("total_ios %s match latencies logged" % jsondata['total_ios'])
+                self.log("total_ios %s match latencies logged" % jsondata['total_ios'])
 
-            latencies.sort()
-            ptiles = jsondata[lat+'_ns']['percentile']
+            ptiles = stat['percentile']
 
-            for percentile in ptiles.keys():
-                #
-                # numpy.percentile(latencies, float(percentile),
-                #       interpolation='higher')
-                # produces values that mostly match what fio reports
-                # however, in the tails of the distribution, the values produced
-                # by fio's and numpy.percentile's algorithms are occasionally off
-                # by one latency measurement. So instead of relying on the canned
-                # numpy.percentile routine, implement here fio's algorithm
-                #
-                rank = math.ceil(float(percentile)/100 * len(latencies))
-                if rank > 0:
-                    index = rank - 1
-                else:
-                    index = 0
-                value = latencies[int(index)]
-                fio_val = int(ptiles[percentile])
-                # The theory in stat.h says that the proportional error will be
-                # less than 1/128
-                if not self.similar(fio_val, value):
-                    delta = abs(fio_val - value) / value
-                    print("Error with %s %sth percentile: "
-                          "fio: %d, expected: %d, proportional delta: %f" %
-                          (lat, percentile, fio_val, value, delta))
-                    print("Rank: %d, index: %d" % (rank, index))
-                    this_iter = False
-                elif self.debug:
-                    print('%s %sth percentile values match: %d, %d' %
-                          (lat, percentile, fio_val, value))
+            if count == 0:
+                self.log('%s: no latencies logged' % lat)
+                retval = False
+                continue
+
+            #
+            # numpy.percentile(latencies, float(percentile),
+            #       interpolation='higher')
+            # produces values that mostly match what fio reports
+            # however, in the tails of the distribution, the values produced
+            # by fio's and numpy.percentile's algorithms are occasionally off
+            # by one latency measurement. So instead of relying on the canned
+            # numpy.percentile routine, implement here fio's algorithm for all
+            # of the reported percentiles at once. Only the values at the
+            # ranks of interest are needed, so partition around those ranks
+            # rather than sorting the whole array. With a histogram, find the
+            # bins holding those ranks instead.
+            #
+            keys = list(ptiles.keys())
+            pcts = np.fromiter(keys, dtype=np.float64, count=len(keys))
+            ranks = np.ceil(pcts/100 * count).astype(np.int64)
+            if self.histogram:
+                values = hist.values
+                indices = hist.find_bins(ranks)
+            else:
+                indices = np.clip(ranks - 1, 0, count - 1)
+                values = np.partition(latencies, indices)
+            expected = values[indices]
+            fio_vals = np.fromiter((int(ptiles[k]) for k in keys), dtype=np.int64,
+                                   count=len(keys))
+            bad = find_mismatches(values, indices, fio_vals)
+
+            for i in np.nonzero(bad)[0]:
+                delta = abs(int(fio_vals[i]) - int(expected[i])) / expected[i] \
+                        if expected[i] else math.inf
+                self.log("Error with %s %sth percentile: "
+                         "fio: %d, expected: %d, proportional delta: %f" %
+                         (lat, keys[i], fio_vals[i], expected[i], delta))
+                self.log("Rank: %d, index: %d" % (ranks[i], indices[i]))
+                this_iter = False
+            if self.debug:
+                for i in np.nonzero(~bad)[0]:
+                    self.log('%s %sth percentile values match: %d, %d' %
+                             (lat, keys[i], fio_vals[i], expected[i]))
 
             if this_iter:
-                print("%s percentiles match" % lat)
+                self.log("%s percentiles match" % lat)
             else:
                 retval = False
 
         return retval
 
+    @staticmethod
+    def read_lat_log(lat_file):
+        """
+        Read latency and data direction columns from a fio latency log.
+
+        The log is parsed a chunk at a time by iter_lat_log() and only the two columns of
+        interest are kept. They are copied into an array sized from the file size, so that
+        no more than one chunk of text and its parsed fields is held in addition to the
+        result.
+
+        lat_file    path to the latency log
+
+        Returns an array with one row per logged IO; column 0 is the latency and column 1
+        is the data direction.
+        """
+
+        # Pages past the last row written are never touched, so overestimating is cheap
+        data = np.empty((os.path.getsize(lat_file) // _MIN_LOG_LINE, 2), dtype=np.int64)
+        count = 0
+        for chunk in FioLatTest.iter_lat_log(lat_file):
+            data[count:count+chunk.shape[0]] = chunk
+            count += chunk.shape[0]
+
+        return data[:count]
+
+    @staticmethod
+    def iter_lat_log(lat_file, chunk_size=_LOG_CHUNK_SIZE):
+        """
+        Read latency and data direction columns from a fio latency log in chunks.
+
+        Only about chunk_size bytes of whole lines are parsed at a time, so that memory use
+        does not depend on the size of the log. Each chunk is parsed with parse_lat_lines().
+
+        lat_file    path to the latency log
+        chunk_size  maximum number of bytes to parse at a time
+        """
+
+        with open(lat_file, 'rb') as file:
+            ncols = file.readline().count(b',') + 1
+            file.seek(0)
+            while True:
+                # Finish the last line so that each chunk holds only whole lines
+                data = file.read(chunk_size)
+                if not data:
+                    break
+                data += file.readline()
+                yield parse_lat_lines(data, ncols, lat_file)
+
+    def load_lat_log(self, lat_file):
+        """
+        Load latency and data direction columns from a fio latency log.
+
+        The text log is parsed a chunk at a time by iter_lat_log(). With binary logs enabled,
+        logs that are checked for both reads and writes are instead converted to a .npy file
+        the first time they are read, and the second read memory maps the .npy file rather
+        than parsing the text again. fio rewrites the logs on every run, so the .npy files
+        are only reused within a run.
+
+        lat_file    path to the latency log
+
+        Yields arrays in the format returned by read_lat_log().
+        """
+
+        #
+        # Any other log is read only once, and converting it would only add
+        # a full parse and a write to that read.
+        #
+        if not self.binary_logs or self.test_options['rw'] != 'randrw' or \
+                self.test_options.get('unified_rw_reporting'):
+            yield from self.iter_lat_log(lat_file)
+            return
+
+        npy_file = os.path.splitext(lat_file)[0] + '.npy'
+        if os.path.exists(npy_file) and \
+                os.path.getmtime(npy_file) >= os.path.getmtime(lat_file):
+            yield np.load(npy_file, mmap_mode='r')
+            return
+
+        data = np.ascontiguousarray(self.read_lat_log(lat_file))
+        np.save(npy_file, data)
+        yield data
+
     @staticmethod
     def check_empty(job):
         """
@@ -371,11 +667,11 @@ class FioLatTest():
             if ddir in job:
                 if 'lat_high_prio' in job[ddir] or 'lat_low_prio' in job[ddir] or \
                     'clat_high_prio' in job[ddir] or 'clat_low_prio' in job[ddir]:
-                    print("Unexpected high/low priority latencies found in %s output" % ddir)
+                    self.log("Unexpected high/low priority latencies found in %s output" % ddir)
                     return False
 
         if self.debug:
-            print("No high/low priority latencies found")
+            self.log("No high/low priority latencies found")
 
         return True
 
@@ -395,8 +691,9 @@ class FioLatTest():
         approximation   value of the bin used by fio to store a given latency
         actual          actual latency value
         """
-        delta = abs(approximation - actual) / actual
-        return delta <= 1/128
+        # Cross-multiply rather than divide: |approximation - actual| / actual <= 1/128
+        delta = approximation - actual
+        return (-delta if delta < 0 else delta) * _ERR_SCALE <= actual
 
     def check_jsonplus(self, jsondata):
         """Check consistency of json+ data
@@ -409,30 +706,30 @@ class FioLatTest():
 
         retval = True
 
-        keys = [int(k) for k in jsondata['bins'].keys()]
-        values = [int(jsondata['bins'][k]) for k in jsondata['bins'].keys()]
-        smallest = min(keys)
-        biggest = max(keys)
-        sampsize = sum(values)
+        bins = np.fromiter(((int(k), int(v)) for k, v in jsondata['bins'].items()),
+                           dtype=_BIN_DTYPE, count=len(jsondata['bins']))
+        smallest = int(bins['duration'].min())
+        biggest = int(bins['duration'].max())
+        sampsize = int(bins['count'].sum())
 
         if not self.similar(jsondata['min'], smallest):
             retval = False
-            print('reported min %d does not match json+ min %d' % (jsondata['min'], smallest))
+            self.log('reported min %d does not match json+ min %d' % (jsondata['min'], smallest))
         elif self.debug:
-            print('json+ min values match: %d' % jsondata['min'])
+            self.log('json+ min values match: %d' % jsondata['min'])
 
         if not self.similar(jsondata['max'], biggest):
             retval = False
-            print('reported max %d does not match json+ max %d' % (jsondata['max'], biggest))
+            self.log('reported max %d does not match json+ max %d' % (jsondata['max'], biggest))
         elif self.debug:
-            print('json+ max values match: %d' % jsondata['max'])
+            self.log('json+ max values match: %d' % jsondata['max'])
 
         if sampsize != jsondata['N']:
             retval = False
-            print('reported sample size %d does not match json+ total count %d' % \
+            self.log('reported sample size %d does not match json+ total count %d' % \
                     (jsondata['N'], sampsize))
         elif self.debug:
-            print('json+ sample sizes match: %d' % sampsize)
+            self.log('json+ sample sizes match: %d' % sampsize)
 
         return retval
 
@@ -448,18 +745,18 @@ class FioLatTest():
         retval = True
 
         if 'percentile' not in jsondata['lat_ns']:
-            print("Sync percentile data not found")
+            self.log("Sync percentile data not found")
             return False
 
         if int(jsondata['total_ios']) != int(jsondata['lat_ns']['N']):
             retval = False
-            print('Mismatch between total_ios and lat_ns sample size')
+            self.log('Mismatch between total_ios and lat_ns sample size')
         elif self.debug:
-            print('sync sample sizes match: %d' % jsondata['total_ios'])
+            self.log('sync sample sizes match: %d' % jsondata['total_ios'])
 
         if not plus:
             if 'bins' in jsondata['lat_ns']:
-                print('Unexpected json+ bin data found')
+                self.log('Unexpected json+ bin data found')
                 return False
 
         if not self.check_jsonplus(jsondata['lat_ns']):
@@ -483,10 +780,10 @@ class FioLatTest():
             json_val = math.floor(jsondata[pct]/1000)
             if terse_val != json_val:
                 retval = False
-                print('Mismatch with %sth percentile: json value=%d,%d terse value=%d' % \
+                self.log('Mismatch with %sth percentile: json value=%d,%d terse value=%d' % \
                         (pct, jsondata[pct], json_val, terse_val))
             elif self.debug:
-                print('Terse %sth percentile matches JSON value: %d' % (pct, terse_val))
+                self.log('Terse %sth percentile matches JSON value: %d' % (pct, terse_val))
 
         return retval
 
@@ -509,42 +806,42 @@ class FioLatTest():
             combined = 'lat_ns'
 
         if not high in jsondata or not low in jsondata or not combined in jsondata:
-            print("Error identifying high/low priority latencies")
+            self.log("Error identifying high/low priority latencies")
             return False
 
         if jsondata[high]['N'] + jsondata[low]['N'] != jsondata[combined]['N']:
-            print("High %d + low %d != combined sample size %d" % \
+            self.log("High %d + low %d != combined sample size %d" % \
                     (jsondata[high]['N'], jsondata[low]['N'], jsondata[combined]['N']))
             return False
         elif self.debug:
-            print("High %d + low %d == combined sample size %d" % \
+            self.log("High %d + low %d == combined sample size %d" % \
                     (jsondata[high]['N'], jsondata[low]['N'], jsondata[combined]['N']))
 
         if min(jsondata[high]['min'], jsondata[low]['min']) != jsondata[combined]['min']:
-            print("Min of high %d, low %d min latencies does not match min %d from combined data" % \
+            self.log("Min of high %d, low %d min latencies does not match min %d from combined data" % \
                     (jsondata[high]['min'], jsondata[low]['min'], jsondata[combined]['min']))
             return False
         elif self.debug:
-            print("Min of high %d, low %d min latencies matches min %d from combined data" % \
+            self.log("Min of high %d, low %d min latencies matches min %d from combined data" % \
                     (jsondata[high]['min'], jsondata[low]['min'], jsondata[combined]['min']))
 
         if max(jsondata[high]['max'], jsondata[low]['max']) != jsondata[combined]['max']:
-            print("Max of high %d, low %d max latencies does not match max %d from combined data" % \
+            self.log("Max of high %d, low %d max latencies does not match max %d from combined data" % \
                     (jsondata[high]['max'], jsondata[low]['max'], jsondata[combined]['max']))
             return False
         elif self.debug:
-            print("Max of high %d, low %d max latencies matches max %d from combined data" % \
+            self.log("Max of high %d, low %d max latencies matches max %d from combined data" % \
                     (jsondata[high]['max'], jsondata[low]['max'], jsondata[combined]['max']))
 
         weighted_avg = (jsondata[high]['mean'] * jsondata[high]['N'] + \
                         jsondata[low]['mean'] * jsondata[low]['N']) / jsondata[combined]['N']
         delta = abs(weighted_avg - jsondata[combined]['mean'])
         if (delta / jsondata[combined]['mean']) > 0.0001:
-            print("Difference between weighted average %f of high, low means "
-                  "and actual mean %f exceeds 0.01%%" % (weighted_avg, jsondata[combined]['mean']))
+            self.log("Difference between weighted average %f of high, low means "
+                     "and actual mean %f exceeds 0.01%%" % (weighted_avg, jsondata[combined]['mean']))
             return False
         elif self.debug:
-            print("Weighted average %f of high, low means matches actual mean %f" % \
+            self.log("Weighted average %f of high, low means matches actual mean %f" % \
                     (weighted_avg, jsondata[combined]['mean']))
 
         if plus:
@@ -560,22 +857,25 @@ class FioLatTest():
                             jsondata[low]['bins'][duration]
 
             if len(bins) != len(jsondata[combined]['bins']):
-                print("Number of combined high/low bins does not match number of overall bins")
+                self.log("Number of combined high/low bins does not match number of overall bins")
                 return False
             elif self.debug:
-                print("Number of bins from merged high/low data matches number of overall bins")
+                self.log("Number of bins from merged high/low data matches number of overall bins")
 
             for duration in bins.keys():
                 if bins[duration] != jsondata[combined]['bins'][duration]:
-                    print("Merged high/low count does not match overall count for duration %d" \
+                    self.log("Merged high/low count does not match overall count for duration %d" \
                             % duration)
                     return False
 
-        print("Merged high/low priority latency data match combined latency data")
+        self.log("Merged high/low priority latency data match combined latency data")
         return True
 
-    def check(self):
-        """Check test output."""
+    def check(self, job):
+        """Check test output.
+
+        job         JSON object for the fio job reported by this test
+        """
 
         raise NotImplementedError()
 
@@ -583,20 +883,18 @@ class FioLatTest():
 class Test001(FioLatTest):
     """Test object for Test 1."""
 
-    def check(self):
+    def check(self, job):
         """Check Test 1 output."""
 
-        job = self.json_data['jobs'][0]
-
         retval = True
         if not self.check_empty(job['write']):
-            print("Unexpected write data found in output")
+            self.log("Unexpected write data found in output")
             retval = False
         if not self.check_empty(job['trim']):
-            print("Unexpected trim data found in output")
+            self.log("Unexpected trim data found in output")
             retval = False
         if not self.check_nocmdprio_lat(job):
-            print("Unexpected high/low priority latencies found")
+            self.log("Unexpected high/low priority latencies found")
             retval = False
 
         retval &= self.check_latencies(job['read'], 0, slat=False)
@@ -607,20 +905,18 @@ class Test001(FioLatTest):
 class Test002(FioLatTest):
     """Test object for Test 2."""
 
-    def check(self):
+    def check(self, job):
         """Check Test 2 output."""
 
-        job = self.json_data['jobs'][0]
-
         retval = True
         if not self.check_empty(job['read']):
-            print("Unexpected read data found in output")
+            self.log("Unexpected read data found in output")
             retval = False
         if not self.check_empty(job['trim']):
-            print("Unexpected trim data found in output")
+            self.log("Unexpected trim data found in output")
             retval = False
         if not self.check_nocmdprio_lat(job):
-            print("Unexpected high/low priority latencies found")
+            self.log("Unexpected high/low priority latencies found")
             retval = False
 
         retval &= self.check_latencies(job['write'], 1, slat=False, clat=False)
@@ -631,20 +927,18 @@ class Test002(FioLatTest):
 class Test003(FioLatTest):
     """Test object for Test 3."""
 
-    def check(self):
+    def check(self, job):
         """Check Test 3 output."""
 
-        job = self.json_data['jobs'][0]
-
         retval = True
         if not self.check_empty(job['read']):
-            print("Unexpected read data found in output")
+            self.log("Unexpected read data found in output")
             retval = False
         if not self.check_empty(job['write']):
-            print("Unexpected write data found in output")
+            self.log("Unexpected write data found in output")
             retval = False
         if not self.check_nocmdprio_lat(job):
-            print("Unexpected high/low priority latencies found")
+            self.log("Unexpected high/low priority latencies found")
             retval = False
 
         retval &= self.check_latencies(job['trim'], 2, slat=False, tlat=False)
@@ -655,20 +949,18 @@ class Test003(FioLatTest):
 class Test004(FioLatTest):
     """Test object for Tests 4, 13."""
 
-    def check(self):
+    def check(self, job):
         """Check Test 4, 13 output."""
 
-        job = self.json_data['jobs'][0]
-
         retval = True
         if not self.check_empty(job['write']):
-            print("Unexpected write data found in output")
+            self.log("Unexpected write data found in output")
             retval = False
         if not self.check_empty(job['trim']):
-            print("Unexpected trim data found in output")
+            self.log("Unexpected trim data found in output")
             retval = False
         if not self.check_nocmdprio_lat(job):
-            print("Unexpected high/low priority latencies found")
+            self.log("Unexpected high/low priority latencies found")
             retval = False
 
         retval &= self.check_latencies(job['read'], 0, plus=True)
@@ -679,20 +971,18 @@ class Test004(FioLatTest):
 class Test005(FioLatTest):
     """Test object for Test 5."""
 
-    def check(self):
+    def check(self, job):
         """Check Test 5 output."""
 
-        job = self.json_data['jobs'][0]
-
         retval = True
         if not self.check_empty(job['read']):
-            print("Unexpected read data found in output")
+            self.log("Unexpected read data found in output")
             retval = False
         if not self.check_empty(job['trim']):
-            print("Unexpected trim data found in output")
+            self.log("Unexpected trim data found in output")
             retval = False
         if not self.check_nocmdprio_lat(job):
-            print("Unexpected high/low priority latencies found")
+            self.log("Unexpected high/low priority latencies found")
             retval = False
 
         retval &= self.check_latencies(job['write'], 1, slat=False, plus=True)
@@ -703,20 +993,18 @@ class Test005(FioLatTest):
 class Test006(FioLatTest):
     """Test object for Test 6."""
 
-    def check(self):
+    def check(self, job):
         """Check Test 6 output."""
 
-        job = self.json_data['jobs'][0]
-
         retval = True
         if not self.check_empty(job['write']):
-            print("Unexpected write data found in output")
+            self.log("Unexpected write data found in output")
             retval = False
         if not self.check_empty(job['trim']):
-            print("Unexpected trim data found in output")
+            self.log("Unexpected trim data found in output")
             retval = False
         if not self.check_nocmdprio_lat(job):
-            print("Unexpected high/low priority latencies found")
+            self.log("Unexpected high/low priority latencies found")
             retval = False
 
         retval &= self.check_latencies(job['read'], 0, slat=False, tlat=False, plus=True)
@@ -727,17 +1015,15 @@ class Test006(FioLatTest):
 class Test007(FioLatTest):
     """Test object for Test 7."""
 
-    def check(self):
+    def check(self, job):
         """Check Test 7 output."""
 
-        job = self.json_data['jobs'][0]
-
         retval = True
         if not self.check_empty(job['trim']):
-            print("Unexpected trim data found in output")
+            self.log("Unexpected trim data found in output")
             retval = False
         if not self.check_nocmdprio_lat(job):
-            print("Unexpected high/low priority latencies found")
+            self.log("Unexpected high/low priority latencies found")
             retval = False
 
         retval &= self.check_latencies(job['read'], 0, clat=False, tlat=False, plus=True)
@@ -749,17 +1035,15 @@ class Test007(FioLatTest):
 class Test008(FioLatTest):
     """Test object for Tests 8, 14."""
 
-    def check(self):
+    def check(self, job):
         """Check Test 8, 14 output."""
 
-        job = self.json_data['jobs'][0]
-
         retval = True
         if 'read' in job or 'write'in job or 'trim' in job:
-            print("Unexpected data direction found in fio output")
+            self.log("Unexpected data direction found in fio output")
             retval = False
         if not self.check_nocmdprio_lat(job):
-            print("Unexpected high/low priority latencies found")
+            self.log("Unexpected high/low priority latencies found")
             retval = False
 
         retval &= self.check_latencies(job['mixed'], 0, plus=True, unified=True)
@@ -770,23 +1054,21 @@ class Test008(FioLatTest):
 class Test009(FioLatTest):
     """Test object for Test 9."""
 
-    def check(self):
+    def check(self, job):
         """Check Test 9 output."""
 
-        job = self.json_data['jobs'][0]
-
         retval = True
         if not self.check_empty(job['read']):
-            print("Unexpected read data found in output")
+            self.log("Unexpected read data found in output")
             retval = False
         if not self.check_empty(job['trim']):
-            print("Unexpected trim data found in output")
+            self.log("Unexpected trim data found in output")
             retval = False
         if not self.check_sync_lat(job['sync'], plus=True):
-            print("Error checking fsync latency data")
+            self.log("Error checking fsync latency data")
             retval = False
         if not self.check_nocmdprio_lat(job):
-            print("Unexpected high/low priority latencies found")
+            self.log("Unexpected high/low priority latencies found")
             retval = False
 
         retval &= self.check_latencies(job['write'], 1, slat=False, plus=True)
@@ -797,17 +1079,15 @@ class Test009(FioLatTest):
 class Test010(FioLatTest):
     """Test object for Test 10."""
 
-    def check(self):
+    def check(self, job):
         """Check Test 10 output."""
 
-        job = self.json_data['jobs'][0]
-
         retval = True
         if not self.check_empty(job['trim']):
-            print("Unexpected trim data found in output")
+            self.log("Unexpected trim data found in output")
             retval = False
         if not self.check_nocmdprio_lat(job):
-            print("Unexpected high/low priority latencies found")
+            self.log("Unexpected high/low priority latencies found")
             retval = False
 
         retval &= self.check_latencies(job['read'], 0, plus=True)
@@ -823,17 +1103,15 @@ class Test010(FioLatTest):
 class Test011(FioLatTest):
     """Test object for Test 11."""
 
-    def check(self):
+    def check(self, job):
         """Check Test 11 output."""
 
-        job = self.json_data['jobs'][0]
-
         retval = True
         if not self.check_empty(job['trim']):
-            print("Unexpected trim data found in output")
+            self.log("Unexpected trim data found in output")
             retval = False
         if not self.check_nocmdprio_lat(job):
-            print("Unexpected high/low priority latencies found")
+            self.log("Unexpected high/low priority latencies found")
             retval = False
 
         retval &= self.check_latencies(job['read'], 0, slat=False, clat=False, plus=True)
@@ -849,17 +1127,15 @@ class Test011(FioLatTest):
 class Test015(FioLatTest):
     """Test object for Test 15."""
 
-    def check(self):
+    def check(self, job):
         """Check Test 15 output."""
 
-        job = self.json_data['jobs'][0]
-
         retval = True
         if not self.check_empty(job['write']):
-            print("Unexpected write data found in output")
+            self.log("Unexpected write data found in output")
             retval = False
         if not self.check_empty(job['trim']):
-            print("Unexpected trim data found in output")
+            self.log("Unexpected trim data found in output")
             retval = False
 
         retval &= self.check_latencies(job['read'], 0, plus=True)
@@ -871,17 +1147,15 @@ class Test015(FioLatTest):
 class Test016(FioLatTest):
     """Test object for Test 16."""
 
-    def check(self):
+    def check(self, job):
         """Check Test 16 output."""
 
-        job = self.json_data['jobs'][0]
-
         retval = True
         if not self.check_empty(job['read']):
-            print("Unexpected read data found in output")
+            self.log("Unexpected read data found in output")
             retval = False
         if not self.check_empty(job['trim']):
-            print("Unexpected trim data found in output")
+            self.log("Unexpected trim data found in output")
             retval = False
 
         retval &= self.check_latencies(job['write'], 1, slat=False, plus=True)
@@ -893,17 +1167,15 @@ class Test016(FioLatTest):
 class Test017(FioLatTest):
     """Test object for Test 17."""
 
-    def check(self):
+    def check(self, job):
         """Check Test 17 output."""
 
-        job = self.json_data['jobs'][0]
-
         retval = True
         if not self.check_empty(job['write']):
-            print("Unexpected write data found in output")
+            self.log("Unexpected write data found in output")
             retval = False
         if not self.check_empty(job['trim']):
-            print("Unexpected trim data found in output")
+            self.log("Unexpected trim data found in output")
             retval = False
 
         retval &= self.check_latencies(job['read'], 0, slat=False, tlat=False, plus=True)
@@ -915,14 +1187,12 @@ class Test017(FioLatTest):
 class Test018(FioLatTest):
     """Test object for Test 18."""
 
-    def check(self):
+    def check(self, job):
         """Check Test 18 output."""
 
-        job = self.json_data['jobs'][0]
-
         retval = True
         if not self.check_empty(job['trim']):
-            print("Unexpected trim data found in output")
+            self.log("Unexpected trim data found in output")
             retval = False
 
         retval &= self.check_latencies(job['read'], 0, clat=False, tlat=False, plus=True)
@@ -941,14 +1211,12 @@ class Test018(FioLatTest):
 class Test019(FioLatTest):
     """Test object for Tests 19, 20."""
 
-    def check(self):
+    def check(self, job):
         """Check Test 19, 20 output."""
 
-        job = self.json_data['jobs'][0]
-
         retval = True
         if 'read' in job or 'write'in job or 'trim' in job:
-            print("Unexpected data direction found in fio output")
+            self.log("Unexpected data direction found in fio output")
             retval = False
 
         retval &= self.check_latencies(job['mixed'], 0, plus=True, unified=True)
@@ -964,15 +1232,89 @@ def parse_args():
     parser.add_argument('-f', '--fio', help='path to file executable (e.g., ./fio)')
     parser.add_argument('-a', '--artifact-root', help='artifact root directory')
     parser.add_argument('-d', '--debug', help='enable debug output', action='store_true')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='save the fio command line, stdout, and stderr for each test')
     parser.add_argument('-s', '--skip', nargs='+', type=int,
                         help='list of test(s) to skip')
     parser.add_argument('-o', '--run-only', nargs='+', type=int,
                         help='list of test(s) to run, skipping all others')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='number of tests to run concurrently (default: number of CPUs)')
+    parser.add_argument('-b', '--binary-logs', action='store_true',
+                        help='convert latency logs checked for both reads and writes to '
+                             '.npy files, so the second check reads those instead')
+    parser.add_argument('-H', '--histogram', action='store_true',
+                        help='check percentiles against a histogram of the latency logs, '
+                             'which bounds memory use regardless of log size')
     args = parser.parse_args()
 
     return args
 
 
+async def run_test(test, artifact_root, fio, args, limit, checker):
+    """Run a single test and check its output.
+
+    Tests write their artifacts to separate subdirectories of artifact_root
+    and share no other state, so many of these may run concurrently.
+
+    limit       semaphore bounding the number of concurrent fio processes
+    checker     executor used to check test output
+
+    Returns a (test, status, messages) tuple, where messages is the text logged by the test.
+    """
+
+    test_obj = test['test_obj'](artifact_root, test, args.debug, args.binary_logs,
+                                args.verbose, args.histogram)
+    try:
+        async with limit:
+            status = await test_obj.run_fio(fio)
+        if status:
+            job = test_obj.json_data['jobs'][0]
+            loop = asyncio.get_event_loop()
+            status = await loop.run_in_executor(checker, test_obj.check, job)
+    except Exception:
+        test_obj.log("Exception: %s" % sys.exc_info()[1])
+        status = False
+
+    return test, status, test_obj.messages.getvalue()
+
+
+async def run_tests(tests, artifact_root, fio, args):
+    """Run tests concurrently, reporting outcomes as they complete.
+
+    Returns a (passed, failed) tuple.
+    """
+
+    passed = 0
+    failed = 0
+
+    #
+    # Checking output means parsing large latency logs. Do this in a
+    # separate thread so that the event loop can keep starting and reaping
+    # fio processes in the meantime. A single thread is enough to overlap
+    # checking with fio runs. Each test's messages are buffered and printed
+    # with its outcome so that output from different tests is not
+    # interleaved.
+    #
+    limit = asyncio.Semaphore(max(1, args.jobs))
+    with ThreadPoolExecutor(max_workers=1) as checker:
+        tasks = [asyncio.ensure_future(run_test(test, artifact_root, fio, args, limit, checker))
+                 for test in tests]
+        for task in asyncio.as_completed(tasks):
+            test, status, messages = await task
+            if status:
+                passed = passed + 1
+                outcome = 'PASSED'
+            else:
+                failed = failed + 1
+                outcome = 'FAILED'
+
+            print(messages, end='')
+            print("**********Test {0} {1}**********".format(test['test_id'], outcome))
+
+    return passed, failed
+
+
 def main():
     """Run tests of fio latency percentile reporting"""
 
@@ -989,9 +1331,9 @@ def main():
         fio = 'fio'
     print("fio path is %s" % fio)
 
-    if platform.system() == 'Linux':
+    if _SYSTEM == 'Linux':
         aio = 'libaio'
-    elif platform.system() == 'Windows':
+    elif _SYSTEM == 'Windows':
         aio = 'windowsaio'
     else:
         aio = 'posixaio'
@@ -1289,32 +1631,35 @@ def main():
         },
     ]
 
-    passed = 0
-    failed = 0
     skipped = 0
 
+    to_run = []
     for test in test_list:
         if (args.skip and test['test_id'] in args.skip) or \
            (args.run_only and test['test_id'] not in args.run_only):
             skipped = skipped + 1
             outcome = 'SKIPPED (User request)'
-        elif platform.system() != 'Linux' and 'cmdprio_percentage' in test:
+        elif _SYSTEM != 'Linux' and 'cmdprio_percentage' in test:
             skipped = skipped + 1
             outcome = 'SKIPPED (Linux required for cmdprio_percentage tests)'
         else:
-            test_obj = test['test_obj'](artifact_root, test, args.debug)
-            status = test_obj.run_fio(fio)
-            if status:
-                status = test_obj.check()
-            if status:
-                passed = passed + 1
-                outcome = 'PASSED'
-            else:
-                failed = failed + 1
-                outcome = 'FAILED'
+            to_run.append(test)
+            continue
 
         print("**********Test {0} {1}**********".format(test['test_id'], outcome))
 
+    #
+    # asyncio.run() requires Python 3.7. Set the loop as the current one so
+    # that, on Python 3.7 and earlier, the subprocess child watcher is
+    # attached to it.
+    #
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        passed, failed = loop.run_until_complete(run_tests(to_run, artifact_root, fio, args))
+    finally:
+        loop.close()
+
     print("{0} tests passed, {1} failed, {2} skipped".format(passed, failed, skipped))
 
     sys.exit(failed)
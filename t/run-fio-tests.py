@@ -29,6 +29,7 @@
 #   out file-based IO will trigger a timeout (t0006).
 # - 4 CPUs (t0009)
 # - SciPy (steadystate_tests.py)
+# - NumPy (latency_percentiles.py)
 # - libzbc (zbd tests)
 # - root privileges (zbd test)
 # - kernel 4.19 or later for zoned null block devices (zbd tests)